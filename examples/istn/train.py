@@ -545,9 +545,11 @@ def create_dataset(config: Config, partition: Union[Partition, str]) -> ImageDat
             f"Dataset partition must be {Partition.TRAIN.value!r} or {Partition.VALID.value!r}"
         )
     keys = config.dataset.train.images.keys()
-    transform = dataset.transform()
-    transform.add_module("cast", CastImage.item(keys, dtype=torch.float32))
-    transform.add_module("resize", ResizeImage.item(keys, size=config.model.input.size))
+    dataset.transform_(
+        dataset.transforms(),
+        CastImage.item(keys, dtype=torch.float32),
+        ResizeImage.item(keys, size=config.model.input.size),
+    )
     return dataset
 
 
@@ -606,10 +606,10 @@ def jacobian_matrix(
         stride=stride,
         add_identity=add_identity,
     )
-    jac = torch.cat(list(deriv.values()), dim=1)
-    jac = move_dim(jac, 1, -1)
+    # Stack derivatives of shape (N, 1, ..., X) directly into channels last layout
+    jac = torch.stack(list(deriv.values()), dim=-1).squeeze(1)
     jac = jac.reshape(jac.shape[:-1] + (D, D))
-    return jac.contiguous()
+    return jac
 
 
 def lie_bracket(
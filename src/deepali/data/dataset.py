@@ -2,22 +2,25 @@ r"""Generic dataset classes and auxiliary functions."""
 
 from __future__ import annotations
 
-from abc import ABCMeta, abstractmethod
+import json
 from copy import copy as shallowcopy
 from dataclasses import dataclass, field
 from pathlib import Path
+from string import Formatter
+from types import MappingProxyType
 from typing import Any, Callable, Dict, List, Iterable, Iterator
-from typing import Mapping, Optional, Union, Sequence, TypeVar, overload
+from typing import Mapping, Optional, Union, Sequence, Tuple, TypeVar, overload
 
 import pandas as pd
 
-from torch.nn import Sequential
+from torch.nn import Module, Sequential
 from torch.utils.data import Dataset as TorchDataset, Subset
 
 from deepali.core.config import DataclassConfig
 from deepali.core.typing import PathStr, Sample, is_namedtuple, is_path_str
+from deepali.modules.lambd import LambdaLayer
 
-from .transforms import Transform
+from .transforms import ItemTransform, ItemwiseTransform, Transform
 from .transforms.image import ImageTransformConfig
 from .transforms.image import image_transforms, prepend_read_image_transform
 
@@ -35,13 +38,16 @@ __all__ = (
 
 TDataset = TypeVar("TDataset", bound="Dataset")
 
+PathFn = Callable[[Mapping[str, Any], int], Any]
 
-class Dataset(TorchDataset, metaclass=ABCMeta):
+
+class Dataset(TorchDataset):
     r"""Base class of datasets with optionally on-the-fly pre-processed samples.
 
     This map-style dataset base class is convenient for attaching data transformations to
     a given dataset. Otherwise, datasets may also derive directly from the respective
     ``torch.utils.data`` dataset classes or simply implement the expected interfaces.
+    Subclasses must implement :meth:`__len__` and :meth:`sample`.
 
     See also: https://pytorch.org/docs/stable/data.html
 
@@ -67,21 +73,25 @@ class Dataset(TorchDataset, metaclass=ABCMeta):
 
         """
         super().__init__()
-        if transforms is None:
-            transform = Sequential()
-        elif isinstance(transforms, Sequential):
-            transform = transforms
-        else:
-            if not isinstance(transforms, (list, tuple)):
-                transforms = [transforms]
-            transform = Sequential(*transforms)
-        self._transform: Sequential = transform
+        self._transforms: Tuple[Transform, ...] = ()
+        self._transform_fns: Tuple[Transform, ...] = ()
+        self.transform_(transforms)
 
-    @abstractmethod
     def __len__(self) -> int:
         r"""Number of samples in dataset."""
         raise NotImplementedError
 
+    def __copy__(self: TDataset) -> TDataset:
+        r"""Make shallow copy of dataset which shares all attribute values with this dataset.
+
+        This is used by :meth:`transform` and :meth:`transforms` to create a new dataset with other
+        data transforms without copying the dataset attributes through the generic ``copy.copy``.
+
+        """
+        other = type(self).__new__(type(self))
+        other.__dict__.update(self.__dict__)
+        return other
+
     def __getitem__(self, index: int) -> Sample:
         r"""Processed data of i-th dataset sample.
 
@@ -93,34 +103,47 @@ class Dataset(TorchDataset, metaclass=ABCMeta):
 
         """
         sample = self.sample(index)
-        sample = self._transform(sample)
+        transforms = self._transform_fns
+        if len(transforms) == 1:
+            return transforms[0](sample)
+        for transform in transforms:
+            sample = transform(sample)
         return sample
 
-    @abstractmethod
-    def sample(self, index: int) -> Sample:
-        r"""Data of i-th dataset sample."""
-        raise NotImplementedError
+    def __getitems__(self, indices: Sequence[int]) -> List[Sample]:
+        r"""Processed data of dataset samples at specified indices.
 
-    def samples(self) -> Iterable[Sample]:
-        r"""Get iterable over untransformed dataset samples."""
+        This method is used by ``torch.utils.data.DataLoader`` to fetch a batch of samples at once.
+        When a subclass overrides ``__getitem__``, the samples are retrieved one at a time instead.
 
-        class SampleIterator(object):
-            def __init__(self, dataset: Dataset):
-                self.dataset = dataset
-                self.index = -1
+        Args:
+            indices: Indices of dataset samples.
 
-            def __iter__(self) -> Iterator[Sample]:
-                self.index = 0
-                return self
+        Returns:
+            List of sample data.
 
-            def __next__(self) -> Sample:
-                if self.index >= len(self.dataset):
-                    raise StopIteration
-                sample = self.dataset.sample(self.index)
-                self.index += 1
-                return sample
+        """
+        if type(self).__getitem__ is not Dataset.__getitem__:
+            return [self[index] for index in indices]
+        transforms = self._transform_fns
+        batch = []
+        for sample in self._samples(indices):
+            for transform in transforms:
+                sample = transform(sample)
+            batch.append(sample)
+        return batch
+
+    def sample(self, index: int) -> Sample:
+        r"""Data of i-th dataset sample."""
+        raise NotImplementedError
 
-        return SampleIterator(self)
+    def _samples(self, indices: Sequence[int]) -> List[Sample]:
+        r"""Data of dataset samples at specified indices."""
+        return [self.sample(index) for index in indices]
+
+    def samples(self) -> Iterator[Sample]:
+        r"""Get iterator over untransformed dataset samples."""
+        return (self.sample(index) for index in range(len(self)))
 
     @overload
     def transform(self) -> Sequential:
@@ -137,9 +160,17 @@ class Dataset(TorchDataset, metaclass=ABCMeta):
     def transform(
         self: TDataset, *args: Union[Transform, Sequence[Transform], None]
     ) -> Union[Sequential, TDataset]:
-        r"""Get composite data preprocessing and augmentation transform, or new dataset with specified transform."""
+        r"""Get composite data preprocessing and augmentation transform, or new dataset with specified transform.
+
+        When called without arguments, a new ``torch.nn.Sequential`` is returned which contains the transforms
+        of this dataset. Changes to this container, e.g., using ``add_module()``, do not affect the dataset.
+        Use ``dataset.transform_(dataset.transforms(), transform)`` to append a transform to the dataset instead.
+
+        """
         if not args:
-            return self._transform
+            return Sequential(
+                *(t if isinstance(t, Module) else LambdaLayer(t) for t in self._transforms)
+            )
         return shallowcopy(self).transform_(*args)
 
     def transform_(
@@ -147,21 +178,17 @@ class Dataset(TorchDataset, metaclass=ABCMeta):
         arg0: Union[Transform, Sequence[Transform], None],
         *args: Union[Transform, Sequence[Transform], None],
     ) -> TDataset:
-        r"""Set data preprocessing and augmentation transform of this dataset."""
-        transforms = []
-        for arg in [arg0, *args]:
-            if arg is None:
-                continue
-            if isinstance(arg, (list, tuple)):
-                transforms.extend(arg)
-            else:
-                transforms.append(arg)
-        if not transforms:
-            self._transform = None
-        elif len(transforms) == 1 and isinstance(transforms[0], Sequential):
-            self._transform = transforms[0]
-        else:
-            self._transform = Sequential(*transforms)
+        r"""Set data preprocessing and augmentation transform of this dataset.
+
+        The given transforms are stored as flat sequence of callables, which are applied in the given order.
+        A ``torch.nn.Sequential`` is unpacked into its child modules unless it is an instance of a subclass.
+        Consecutive :class:`.ItemTransform` modules wrapping an :class:`.ItemwiseTransform` which transform
+        the same sample item are combined into a single item transform, such that the sample is copied and
+        the item looked up only once.
+
+        """
+        self._transforms = tuple(_flatten_transforms([arg0, *args]))
+        self._transform_fns = tuple(_fuse_item_transforms(self._transforms))
         return self
 
     @overload
@@ -182,7 +209,7 @@ class Dataset(TorchDataset, metaclass=ABCMeta):
     ) -> Union[List[Transform], TDataset]:
         r"""Get or set dataset transforms."""
         if not args:
-            return [transform for transform in self._transform]
+            return list(self._transforms)
         return shallowcopy(self).transform_(*args)
 
     def transforms_(
@@ -211,6 +238,7 @@ class MetaDataset(Dataset):
         paths: Optional[Mapping[str, Union[PathStr, Callable[..., PathStr]]]] = None,
         prefix: Optional[PathStr] = None,
         transforms: Optional[Union[Transform, Sequence[Transform]]] = None,
+        keep_table: bool = False,
         **kwargs,
     ):
         r"""Initialize dataset.
@@ -231,15 +259,21 @@ class MetaDataset(Dataset):
                 If ``None`` and ``table`` is a file path, it is set to the directory containing the index table.
                 Otherwise, template file path strings may not contain a ``{prefix}`` key if ``None``.
             transforms: Data preprocessing and augmentation transforms.
+            keep_table: Whether to retain the ``table`` data frame. By default, only the table row values
+                are kept as dictionaries, and :attr:`table` creates a new data frame from these when accessed.
+                This reduces the memory used by each data loader worker process.
             kwargs: Additional format arguments used in addition to ``prefix`` and ``table`` column values.
 
         """
+        # Make paths absolute only once. Note that Path.absolute() returns an absolute path as is
+        # without querying the current working directory. Relative paths are resolved here rather
+        # than on first use, because the working directory may change in between.
+        prefix = Path(prefix).absolute() if prefix else prefix
         if isinstance(table, (str, Path)):
             if prefix is None:
                 path = Path(table).absolute()
                 prefix = path.parent
             elif prefix:
-                prefix = Path(prefix).absolute()
                 path = prefix / Path(table)
             else:
                 path = Path(table).absolute()
@@ -248,79 +282,161 @@ class MetaDataset(Dataset):
             raise TypeError(
                 f"{type(self).__name__}() 'table' must be pandas.DataFrame or file path"
             )
-        df: pd.DataFrame = table
         paths = {} if paths is None else dict(paths)
-        if "meta" in df.columns:
+        if "meta" in paths:
+            raise ValueError(f"{type(self).__name__} 'paths' contains reserved 'meta' key")
+        self._keep_table = keep_table
+        self._paths: Dict[str, Union[PathStr, Callable[..., PathStr]]] = paths
+        self._prefix: Optional[Path] = prefix or None
+        self._kwargs: Dict[str, Any] = kwargs
+        self._set_table(table)
+        super().__init__(transforms=transforms)
+
+    def _set_table(self, table: pd.DataFrame) -> None:
+        r"""Set dataset index table and update attributes derived from it."""
+        if not isinstance(table, pd.DataFrame):
+            raise TypeError(f"{type(self).__name__}.table must be pandas.DataFrame")
+        if "meta" in table.columns:
             raise ValueError(
                 f"{type(self).__name__} 'table' contains column with reserved name 'meta'"
             )
+        self._table: Optional[pd.DataFrame] = table if self._keep_table else None
+        self._columns: Tuple[str, ...] = tuple(table.columns)
+        # Convert table rows to dictionaries once instead of on each sample access
+        self._rows: List[Dict[str, Any]] = _table_rows(table)
+        self._update_path_fns()
+
+    def _update_path_fns(self) -> None:
+        r"""Update input file path functions after a change of table columns, paths, or format arguments."""
+        # Convert prefix to string and collect static format arguments only once
+        prefix = self._prefix
+        self._prefix_str: Optional[str] = str(prefix) if prefix else None
+        self._base_args: Dict[str, Any] = {"prefix": self._prefix_str} if prefix else {}
+        self._base_args.update(self._kwargs)
+        # Parse file path template strings once instead of on each sample access
+        self._path_fns: Dict[str, PathFn] = {
+            name: _path_fn(path, self._columns, self._base_args)
+            for name, path in self._paths.items()
+        }
+        # Names of input file paths whose values are given by a table column
+        self._path_columns: Dict[str, str] = {
+            name: str(path)
+            for name, path in self._paths.items()
+            if not callable(path) and str(path) in self._columns
+        }
+
+    @property
+    def paths(self) -> Mapping[str, Union[PathStr, Callable[..., PathStr]]]:
+        r"""Read-only view of input file path template strings. Assign a new mapping to change these."""
+        return MappingProxyType(self._paths)
+
+    @paths.setter
+    def paths(self, paths: Optional[Mapping[str, Union[PathStr, Callable[..., PathStr]]]]) -> None:
+        r"""Set input file path template strings."""
+        paths = {} if paths is None else dict(paths)
         if "meta" in paths:
             raise ValueError(f"{type(self).__name__} 'paths' contains reserved 'meta' key")
-        prefix = Path(prefix).absolute() if prefix else None
-        self.table = df
-        self.paths = paths
-        self.prefix = prefix
-        self.kwargs = kwargs
-        super().__init__(transforms=transforms)
+        self._paths = paths
+        self._update_path_fns()
+
+    @property
+    def prefix(self) -> Optional[Path]:
+        r"""Root directory of input file paths starting with ``"{prefix}/"``."""
+        return self._prefix
+
+    @prefix.setter
+    def prefix(self, prefix: Optional[PathStr]) -> None:
+        r"""Set root directory of input file paths."""
+        self._prefix = Path(prefix).absolute() if prefix else None
+        self._update_path_fns()
+
+    @property
+    def kwargs(self) -> Mapping[str, Any]:
+        r"""Read-only view of additional format arguments. Assign a new mapping to change these."""
+        return MappingProxyType(self._kwargs)
+
+    @kwargs.setter
+    def kwargs(self, kwargs: Optional[Mapping[str, Any]]) -> None:
+        r"""Set additional format arguments."""
+        self._kwargs = {} if kwargs is None else dict(kwargs)
+        self._update_path_fns()
+
+    @property
+    def table(self) -> pd.DataFrame:
+        r"""Dataset index table.
+
+        Unless the dataset was created with ``keep_table=True``, a new data frame is created from the
+        table row values each time this property is accessed. This copies all table values, and the
+        returned data frame should thus be stored in a local variable when it is used repeatedly.
+        Modifications of the returned data frame do not affect the dataset unless it is assigned
+        to this property again, which also updates the file paths of the dataset samples.
+
+        """
+        if self._table is None:
+            return pd.DataFrame.from_records(self._rows, columns=self._columns)
+        return self._table
+
+    @table.setter
+    def table(self, table: pd.DataFrame) -> None:
+        r"""Set dataset index table."""
+        self._set_table(table)
 
     def __len__(self) -> int:
         r"""Number of samples in dataset."""
-        return len(self.table)
+        return len(self._rows)
 
     def row(self, index: int) -> Dict[str, Any]:
         r"""Get i-th table row values."""
-        return self.table.iloc[index].to_dict()
+        return dict(self._rows[index])
 
     def sample(self, index: int) -> Dict[str, Any]:
         r"""Input file paths and/or meta-data of i-th sample in dataset."""
         meta = self.row(index)
-        if not self.paths:
+        if not self._path_fns:
             return meta
         data = {}
-        args = {"prefix": str(self.prefix)} if self.prefix else {}
-        args["index"] = index
-        args["index+1"] = index + 1
-        args["index + 1"] = index + 1
-        args.update(self.kwargs)
-        args.update(meta)
-        for name, path in self.paths.items():
-            if callable(path):
-                path = path(**args)
-            elif path in meta:
-                path = meta[path]
-            else:
-                path = path.format(**args)
+        for name, path_fn in self._path_fns.items():
+            path = path_fn(meta, index)
             if not path:
                 continue
-            path = str(path)
-            data[name] = path
-            # Make path also available in meta-data dictionary such that even when data[name]
-            # is replaced by the actual data stored at the given input file path (e.g., by a
-            # ReadImage transform attached to the dataset), the file path remains available.
-            meta[name] = path
+            data[name] = str(path)
+        # Make paths also available in meta-data dictionary such that even when data[name]
+        # is replaced by the actual data stored at the given input file path (e.g., by a
+        # ReadImage transform attached to the dataset), the file path remains available.
+        meta.update(data)
         data["meta"] = meta
         return data
 
-    def samples(self) -> Iterable[Dict[str, Any]]:
-        r"""Get iterable over untransformed dataset samples."""
-
-        class DatasetSampleIterator(object):
-            def __init__(self, dataset: MetaDataset):
-                self.dataset = dataset
-                self.index = -1
-
-            def __iter__(self) -> Iterator[Dict[str, Any]]:
-                self.index = 0
-                return self
-
-            def __next__(self) -> Dict[str, Any]:
-                if self.index >= len(self.dataset):
-                    raise StopIteration
-                sample = self.dataset.sample(self.index)
-                self.index += 1
-                return sample
-
-        return DatasetSampleIterator(self)
+    def _samples(self, indices: Sequence[int]) -> List[Dict[str, Any]]:
+        r"""Input file paths and/or meta-data of dataset samples at specified indices."""
+        cls = type(self)
+        if cls.sample is not MetaDataset.sample or cls.row is not MetaDataset.row:
+            return [self.sample(index) for index in indices]
+        rows = self._rows
+        metas = [dict(rows[index]) for index in indices]
+        if not self._path_fns:
+            return metas
+        batch = [{} for _ in metas]
+        for name, path_fn in self._path_fns.items():
+            column = self._path_columns.get(name)
+            if column is None:
+                paths = [path_fn(meta, index) for meta, index in zip(metas, indices)]
+            else:
+                paths = [meta[column] for meta in metas]
+            for data, path in zip(batch, paths):
+                if path:
+                    data[name] = str(path)
+        for data, meta in zip(batch, metas):
+            meta.update(data)
+            data["meta"] = meta
+        return batch
+
+    def samples(self) -> Iterator[Dict[str, Any]]:
+        r"""Get iterator over untransformed dataset samples."""
+        cls = type(self)
+        if not self._path_fns and cls.sample is MetaDataset.sample and cls.row is MetaDataset.row:
+            return (dict(row) for row in self._rows)
+        return (self.sample(index) for index in range(len(self._rows)))
 
 
 @dataclass
@@ -425,24 +541,26 @@ class GroupDataset(TorchDataset):
         ascending: bool = True,
     ) -> None:
         super().__init__()
-        indices = []
-        df = dataset.table
+        # Use positions of rows in dataset table as index labels of sorted table
+        df = dataset.table.reset_index(drop=True)
         if sortby:
             df = df.sort_values(sortby, ascending=ascending)
+        labels = df.index.to_numpy()
         groups = df.groupby(groupby)
-        for _, group in groups:
-            assert isinstance(group, pd.DataFrame)
-            ilocs = [row[0] for row in group.itertuples(index=True)]
-            indices.append(ilocs)
+        indices = [labels[ilocs].tolist() for ilocs in groups.indices.values()]
         self.dataset = dataset
         self.indices = indices
+        self._subsets: Dict[int, Subset[Dict[str, Any]]] = {}
 
     def __len__(self) -> int:
         return len(self.indices)
 
     def __getitem__(self, index: int) -> Subset[Dict[str, Any]]:
-        indices = self.indices[index]
-        return Subset(self.dataset, indices)
+        subset = self._subsets.get(index)
+        if subset is None:
+            subset = Subset(self.dataset, self.indices[index])
+            self._subsets[index] = subset
+        return subset
 
 
 class JoinDataset(Dataset):
@@ -468,21 +586,237 @@ class JoinDataset(Dataset):
                     data = data._asdict()
                 else:
                     data = {str(i): data}
-            for key, value in data.items():
-                current = sample.get(key, None)
-                if current is not None and current != value:
-                    raise ValueError("JoinDataset() encountered ambiguous duplicate key '{key}'")
-                sample[key] = value
+            # Only compare values of duplicate keys, which are usually absent
+            if not sample.keys().isdisjoint(data):
+                for key in sample.keys() & data.keys():
+                    current = sample[key]
+                    value = data[key]
+                    if current is not None and current is not value and current != value:
+                        raise ValueError(
+                            f"JoinDataset() encountered ambiguous duplicate key '{key}'"
+                        )
+            sample.update(data)
         return sample
 
 
-def read_table(path: PathStr) -> pd.DataFrame:
-    r"""Read dataset index table."""
+def read_table(
+    path: PathStr,
+    dtype: Optional[Mapping[str, Any]] = None,
+    columns: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    r"""Read dataset index table.
+
+    Args:
+        path: File path of ``.csv``, ``.tsv``, or ``.h5`` table.
+        dtype: Data types of ``.csv`` or ``.tsv`` table columns. If ``None`` and a JSON file named
+            ``f"{path}.dtypes.json"`` exists, the column data types are read from this file.
+            Columns with known data types can be parsed in a single pass without type inference.
+        columns: Names of table columns to read. If ``None``, all columns are read. When an ``.h5``
+            file was written in "table" format, other columns are not loaded into memory.
+
+    Returns:
+        Dataset index table.
+
+    """
     path = Path(path).absolute()
+    if columns is not None:
+        columns = list(columns)
     if path.suffix.lower() == ".h5":
-        return pd.read_hdf(path)
-    if path.suffix.lower() == ".tsv":
-        return pd.read_csv(path, comment="#", skip_blank_lines=True, delimiter="\t")
-    if path.suffix.lower() == ".csv":
-        return pd.read_csv(path, comment="#", skip_blank_lines=True)
+        try:
+            return pd.read_hdf(path, columns=columns)
+        except TypeError:  # "fixed" format store must be read in its entirety
+            if columns is None:
+                raise
+        return pd.read_hdf(path)[columns]
+    if path.suffix.lower() in (".csv", ".tsv"):
+        delimiter = "\t" if path.suffix.lower() == ".tsv" else ","
+        if dtype is None:
+            dtype_path = path.with_name(path.name + ".dtypes.json")
+            if dtype_path.is_file():
+                with dtype_path.open("rt") as fp:
+                    dtype = json.load(fp)
+        return pd.read_csv(
+            path,
+            comment="#",
+            skip_blank_lines=True,
+            delimiter=delimiter,
+            usecols=columns,
+            dtype=dtype,
+            engine="c",
+            low_memory=False,
+            memory_map=True,
+        )
     raise NotImplementedError(f"read_table() does not support {path.suffix} file format")
+
+
+def _table_rows(table: pd.DataFrame) -> List[Dict[str, Any]]:
+    r"""Convert table to list of row dictionaries.
+
+    Repeated string values in a column, e.g., subject IDs or image modalities, are replaced by
+    references to the same ``str`` object to reduce the memory used by the row dictionaries.
+
+    """
+    rows = table.to_dict(orient="records")
+    for name, dtype in table.dtypes.items():
+        if dtype != object and not pd.api.types.is_string_dtype(dtype):
+            continue
+        values = {}
+        for row in rows:
+            value = row[name]
+            if isinstance(value, str):
+                row[name] = values.setdefault(value, value)
+    return rows
+
+
+def _flatten_transforms(
+    transforms: Iterable[Union[Transform, Sequence[Transform], None]],
+) -> Iterator[Transform]:
+    r"""Iterate over data transforms in nested sequences and ``torch.nn.Sequential`` containers."""
+    for transform in transforms:
+        if transform is None:
+            continue
+        if isinstance(transform, (list, tuple)) or type(transform) is Sequential:
+            yield from _flatten_transforms(transform)
+        else:
+            yield transform
+
+
+def _fuse_item_transforms(transforms: Iterable[Transform]) -> Iterator[Transform]:
+    r"""Combine consecutive item transforms of the same sample item into a single item transform."""
+    stage: List[ItemTransform] = []
+    for transform in transforms:
+        if stage and not _is_fusable_item_transform(stage[0], transform):
+            yield _fused_item_transform(stage)
+            stage = []
+        if _is_fusable_item_transform(transform, transform):
+            stage.append(transform)
+        else:
+            yield transform
+    if stage:
+        yield _fused_item_transform(stage)
+
+
+def _is_fusable_item_transform(a: Transform, b: Transform) -> bool:
+    r"""Whether item transform ``b`` can be applied as part of the same item transform as ``a``.
+
+    Only item value transforms of type :class:`.ItemwiseTransform` are fused, which map a leaf value to
+    a new leaf value. A generic item value transform may return a container, e.g., a list, of which each
+    leaf would otherwise be transformed separately by the next :class:`.ItemTransform`.
+
+    """
+    return (
+        type(a) is ItemTransform
+        and type(b) is ItemTransform
+        and isinstance(a.transform, ItemwiseTransform)
+        and isinstance(b.transform, ItemwiseTransform)
+        and isinstance(a.transform, Module)
+        and isinstance(b.transform, Module)
+        and isinstance(a.key, str)
+        and a.key == b.key
+        and not a.copy
+        and not b.copy
+        and a.ignore_meta == b.ignore_meta
+        and a.ignore_missing == b.ignore_missing
+    )
+
+
+def _fused_item_transform(stage: Sequence[ItemTransform]) -> ItemTransform:
+    r"""Create item transform which applies the item value transforms of a fused stage in order."""
+    if len(stage) == 1:
+        return stage[0]
+    return ItemTransform(
+        Sequential(*(transform.transform for transform in stage)),
+        key=stage[0].key,
+        ignore_meta=stage[0].ignore_meta,
+        ignore_missing=stage[0].ignore_missing,
+    )
+
+
+def _index_args(index: int) -> Dict[str, int]:
+    r"""Sample index format arguments of file path template strings."""
+    return {"index": index, "index+1": index + 1, "index + 1": index + 1}
+
+
+class _CallPathFn:
+    r"""Input file path function which calls a user function with table row values as keyword arguments."""
+
+    def __init__(self, func: Callable[..., PathStr], args: Mapping[str, Any]) -> None:
+        self.func = func
+        self.args = dict(args)
+
+    def __call__(self, row: Mapping[str, Any], index: int) -> PathStr:
+        kwargs = _index_args(index)
+        kwargs.update(self.args)
+        kwargs.update(row)
+        return self.func(**kwargs)
+
+
+class _ColumnPathFn:
+    r"""Input file path function which returns the value of a table column."""
+
+    def __init__(self, column: str) -> None:
+        self.column = column
+
+    def __call__(self, row: Mapping[str, Any], index: int) -> Any:
+        return row[self.column]
+
+
+class _FormatPathFn:
+    r"""Input file path function which substitutes the keys of a pre-parsed template string."""
+
+    def __init__(
+        self,
+        template: str,
+        row_keys: Tuple[str, ...],
+        static_args: Mapping[str, Any],
+        index_keys: Tuple[str, ...],
+    ) -> None:
+        self.template = template
+        self.row_keys = row_keys
+        self.static_args = dict(static_args)
+        self.index_keys = index_keys
+
+    def __call__(self, row: Mapping[str, Any], index: int) -> str:
+        kwargs = dict(self.static_args)
+        for key in self.row_keys:
+            kwargs[key] = row[key]
+        for key in self.index_keys:
+            kwargs[key] = index if key == "index" else index + 1
+        return self.template.format(**kwargs)
+
+
+def _path_fn(
+    path: Union[PathStr, Callable[..., PathStr]],
+    columns: Iterable[str],
+    args: Mapping[str, Any],
+) -> PathFn:
+    r"""Create function which maps table row values and sample index to input file path.
+
+    The returned function is an instance of a module-level class such that datasets remain
+    picklable, e.g., for data loader worker processes started with "spawn" or "forkserver".
+
+    Args:
+        path: File path template string, name of table column, or callable (cf. ``MetaDataset``).
+        columns: Names of table columns.
+        args: Format arguments other than table row values and sample index.
+
+    Returns:
+        Function which takes the table row values and sample index as arguments.
+
+    """
+    columns = set(columns)
+    if callable(path):
+        return _CallPathFn(path, args)
+    template = str(path)
+    if template in columns:
+        return _ColumnPathFn(template)
+    keys = set()
+    for _, field_name, _, _ in Formatter().parse(template):
+        if field_name:
+            keys.add(field_name.split(".", 1)[0].split("[", 1)[0])
+    row_keys = tuple(key for key in keys if key in columns)
+    static_args = {key: args[key] for key in keys if key not in columns and key in args}
+    index_keys = tuple(
+        key for key in _index_args(0) if key in keys and key not in columns and key not in args
+    )
+    return _FormatPathFn(template, row_keys, static_args, index_keys)
@@ -1,9 +1,13 @@
 r"""Loss functions, evaluation metrics, and related utilities."""
 
+from functools import lru_cache
+from importlib import import_module
 import itertools
-from typing import Protocol, Optional, Tuple, Union
+import os
+from typing import Callable, Dict, Mapping, Protocol, Optional, Sequence, Set, Tuple, Type, Union
 
 import math
+import warnings
 
 import torch
 from torch import Tensor
@@ -53,7 +57,10 @@ __all__ = (
     "tversky_loss_with_logits",
     "inverse_consistency_loss",
     "masked_loss",
+    "normalize_loss",
     "reduce_loss",
+    "regularization_losses",
+    "set_compile_enabled",
     "wlcc_loss",
 )
 
@@ -65,6 +72,152 @@ class ElementwiseLoss(Protocol):
         ...
 
 
+# Whether to use torch.compile for CUDA tensors, set to False when compilation failed.
+# Compilation can be disabled by setting environment variable DEEPALI_COMPILE_LOSSES=0.
+_COMPILE = hasattr(torch, "compile") and os.environ.get(
+    "DEEPALI_COMPILE_LOSSES", "1"
+).lower() not in ("0", "false", "no", "off")
+
+
+def set_compile_enabled(enabled: bool) -> None:
+    r"""Enable or disable the use of ``torch.compile`` for the evaluation of losses of CUDA tensors.
+
+    Compilation is enabled by default when supported by the installed PyTorch version, unless the
+    environment variable ``DEEPALI_COMPILE_LOSSES`` is set to ``0``. It is disabled automatically
+    when a loss function failed to compile. Errors raised during the backward pass of a compiled
+    function cannot be recovered from in this way, and compilation should be disabled explicitly
+    using this function when these occur.
+
+    """
+    global _COMPILE
+    _COMPILE = bool(enabled) and hasattr(torch, "compile")
+
+
+def _compile_errors() -> Tuple[Type[Exception], ...]:
+    r"""Types of exceptions raised when a function cannot be compiled by ``torch.compile``."""
+    errors = []
+    for module, names in (
+        ("torch._dynamo.exc", ("BackendCompilerFailed", "Unsupported", "TritonUnavailableError")),
+        ("torch._inductor.exc", ("InductorError",)),
+    ):
+        try:
+            exc = import_module(module)
+        except ImportError:
+            continue
+        errors.extend(getattr(exc, name) for name in names if hasattr(exc, name))
+    return tuple(errors)
+
+
+@lru_cache(maxsize=32)
+def _compiled(fn: Callable, key: Tuple) -> Callable:
+    r"""Get compiled loss function which fuses elementwise operations into fewer kernels.
+
+    The ``key`` is only used for caching such that each distinct configuration is compiled once.
+
+    """
+    return torch.compile(fn, fullgraph=True, dynamic=False)
+
+
+def _call_compiled(fn: Callable, key: Tuple, input: Tensor, *args) -> Tensor:
+    r"""Evaluate compiled loss function for CUDA tensors and uncompiled function otherwise."""
+    global _COMPILE
+    if _COMPILE and input.is_cuda:
+        try:
+            return _compiled(fn, key)(input, *args)
+        except _compile_errors() as error:
+            # Disable compilation, e.g., when no suitable backend compiler is available
+            _COMPILE = False
+            warnings.warn(
+                f"Failed to compile loss function {fn.__name__}(), using eager mode instead."
+                " Use deepali.losses.functional.set_compile_enabled(False) or environment"
+                f" variable DEEPALI_COMPILE_LOSSES=0 to disable compilation. Error: {error}",
+                RuntimeWarning,
+            )
+    return fn(input, *args)
+
+
+def _float_dtype(*data: Tensor) -> torch.dtype:
+    r"""Floating point type in which to evaluate a loss given its input tensors.
+
+    Unlike ``Tensor.float()``, this preserves the precision of double and bfloat16 inputs, e.g.,
+    as used in mixed precision training. Non-floating point types and float16 are promoted to float32,
+    because the reduction of image volumes would otherwise be prone to overflow.
+
+    """
+    dtype = None
+    for tensor in data:
+        other = tensor.dtype if tensor.is_floating_point() else torch.float32
+        dtype = other if dtype is None else torch.promote_types(dtype, other)
+    if dtype is None or dtype == torch.float16:
+        dtype = torch.float32
+    return dtype
+
+
+@lru_cache(maxsize=8)
+def _grad_keys(spatial_dims: int) -> Tuple[str, ...]:
+    r"""Keys of first order spatial derivatives evaluated by :func:`grad_loss()`."""
+    return tuple(SpatialDerivativeKeys.all(spatial_dims=spatial_dims, order=1))
+
+
+@lru_cache(maxsize=8)
+def _bending_keys(spatial_dims: int) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    r"""Keys of unique unmixed and mixed second order flow derivatives, respectively."""
+    which = FlowDerivativeKeys.all(spatial_dims=spatial_dims, order=2)
+    which = sorted(FlowDerivativeKeys.unique(which))
+    unmixed = tuple(key for key in which if not FlowDerivativeKeys.is_mixed(key))
+    mixed = tuple(key for key in which if FlowDerivativeKeys.is_mixed(key))
+    return unmixed, mixed
+
+
+@lru_cache(maxsize=8)
+def _curvature_keys(spatial_dims: int) -> Tuple[Tuple[str, ...], ...]:
+    r"""Keys of unmixed second order flow derivatives grouped by vector field component."""
+    D = spatial_dims
+    return tuple(tuple(FlowDerivativeKeys.symbol(i, j, j) for j in range(D)) for i in range(D))
+
+
+@lru_cache(maxsize=8)
+def _jacobian_keys(spatial_dims: int) -> Tuple[str, ...]:
+    r"""Keys of first order flow derivatives in row-major order of Jacobian matrix entries."""
+    D = spatial_dims
+    return tuple(FlowDerivativeKeys.symbol(i, j) for i, j in itertools.product(range(D), repeat=2))
+
+
+def _bending_term(deriv: Mapping[str, Tensor], spatial_dims: int) -> Tensor:
+    r"""Bending energy at each grid point given unique second order flow derivatives.
+
+    The input derivative tensors are not modified such that these can be shared by other terms.
+
+    """
+    unmixed, mixed = _bending_keys(spatial_dims)
+    loss = deriv[unmixed[0]].square()
+    for key in unmixed[1:]:
+        value = deriv[key]
+        loss = loss.addcmul_(value, value)
+    # Each unique mixed derivative accounts for two equal entries of the Hessian
+    for key in mixed:
+        value = deriv[key]
+        loss = loss.addcmul_(value, value, value=2)
+    return loss
+
+
+def _curvature_term(deriv: Mapping[str, Tensor], spatial_dims: int) -> Tensor:
+    r"""Sum of squared Laplacians of flow components at each grid point.
+
+    The input derivative tensors are not modified such that these can be shared by other terms.
+
+    """
+    loss: Optional[Tensor] = None
+    for keys in _curvature_keys(spatial_dims):
+        laplacian = deriv[keys[0]].add(deriv[keys[1]])
+        for key in keys[2:]:
+            laplacian = laplacian.add_(deriv[key])
+        value = laplacian.square_()
+        loss = value if loss is None else loss.add_(value)
+    assert loss is not None
+    return loss
+
+
 def label_smoothing(
     labels: Tensor,
     num_classes: Optional[int] = None,
@@ -93,14 +246,40 @@ def label_smoothing(
         raise TypeError("label_smoothing() 'labels' must be Tensor")
     if labels.ndim < 4:
         raise ValueError("label_smoothing() 'labels' must be tensor of shape (N, C, ..., X)")
+    if labels.shape[1] == 1 and num_classes != 1:
+        if num_classes is None:
+            values = labels if ignore_index is None else labels[labels != ignore_index]
+            if values.numel() == 0:
+                raise ValueError(
+                    "label_smoothing() 'num_classes' required when all 'labels' equal 'ignore_index'"
+                )
+            num_classes = int(values.max()) + 1
+        if num_classes < 2 and alpha > 0:
+            raise ValueError(
+                f"label_smoothing() 'num_classes' must be at least 2 when 'alpha' > 0, got {num_classes}"
+            )
+        # Write smoothed one-hot encoding directly instead of transforming as_one_hot_tensor()
+        offset = alpha / (num_classes - 1) if alpha > 0 else 0
+        index = labels.long()
+        if ignore_index is not None:
+            ignore = labels == ignore_index
+            index = index.masked_fill(ignore, 0)
+        shape = (labels.shape[0], num_classes) + labels.shape[2:]
+        target = torch.full(shape, offset, dtype=torch.float32, device=labels.device)
+        target = target.scatter_(1, index, 1 - alpha)
+        if ignore_index is not None:
+            target = target.masked_fill_(ignore, ignore_index * (1 - alpha - offset) + offset)
+        return target
     if labels.shape[1] == 1:
         target = as_one_hot_tensor(
             labels, num_classes, ignore_index=ignore_index, dtype=torch.float32
         )
     else:
-        target = labels.float()
+        target = labels.to(_float_dtype(labels))
     if alpha > 0:
-        target = (1 - alpha) * target + alpha * (1 - target) / (target.size(1) - 1)
+        # (1 - alpha) * target + alpha * (1 - target) / (C - 1) expressed as scale and offset
+        offset = alpha / (target.size(1) - 1)
+        target = target.mul(1 - alpha - offset).add_(offset)
     return target
 
 
@@ -178,11 +357,12 @@ def dice_score(
         raise ValueError("dice_score() 'input' must be tensor of shape (N, C, ..., X)")
     if input.shape != target.shape:
         raise ValueError("dice_score() 'input' and 'target' must have identical shape")
-    y_pred = input.float()
-    y = target.float()
+    dtype = _float_dtype(input, target)
+    y_pred = input.to(dtype)
+    y = target.to(dtype)
     intersection = dot_channels(y_pred, y, weight=weight)
     denominator = dot_channels(y_pred, y_pred, weight=weight) + dot_channels(y, y, weight=weight)
-    loss = intersection.mul_(2).add_(epsilon).div(denominator.add_(epsilon))
+    loss = intersection.mul_(2).add_(epsilon).div_(denominator.add_(epsilon))
     loss = reduce_loss(loss, reduction)
     return loss
 
@@ -522,12 +702,16 @@ def kld_loss(mean: Tensor, logvar: Tensor, reduction: str = "mean") -> Tensor:
     Kingma and Welling, Auto-Encoding Variational Bayes, ICLR 2014, https://arxiv.org/abs/1312.6114 (Appendix B).
 
     """
-    loss = mean.square().add_(logvar.exp()).sub_(1).sub_(logvar)
+    loss = _call_compiled(_kld_core, (mean.ndim, mean.dtype), mean, logvar)
     loss = reduce_loss(loss, reduction)
-    loss = loss.mul_(0.5)
     return loss
 
 
+def _kld_core(mean: Tensor, logvar: Tensor) -> Tensor:
+    r"""Evaluate Kullback-Leibler divergence of each latent variable."""
+    return mean.square().add_(logvar.exp()).sub_(1).sub_(logvar).mul_(0.5)
+
+
 def ncc_loss(
     source: Tensor,
     target: Tensor,
@@ -584,6 +768,7 @@ def lcc_loss(
     kernel_size: ScalarOrTuple[int] = 7,
     epsilon: float = 1e-15,
     reduction: str = "mean",
+    mask_sum: Optional[Union[float, Tensor]] = None,
 ) -> Tensor:
     r"""Local normalized cross correlation.
 
@@ -600,6 +785,7 @@ def lcc_loss(
         epsilon: Small constant added to denominator to avoid division by zero.
         reduction: Whether to compute "mean" or "sum" over all grid points. If "none", output
             tensor shape is equal to the shape of the input tensors given an odd kernel size.
+        mask_sum: Precomputed ``mask.sum()`` used by :func:`reduce_loss()` if ``reduction="mean"``.
 
     Returns:
         Negative local normalized cross correlation plus one.
@@ -613,41 +799,63 @@ def lcc_loss(
     if source.shape != target.shape:
         raise ValueError("lcc_loss() 'source' must have same shape as 'target'")
 
-    def local_sum(data: Tensor) -> Tensor:
-        return avg_pool(
-            data,
-            kernel_size=kernel_size,
-            stride=1,
-            padding=None,
-            divisor_override=1,
-        )
+    dtype = _float_dtype(source, target)
+    # PyTorch has no bfloat16 CPU kernel for avg_pool3d()
+    if dtype == torch.bfloat16 and source.ndim > 4 and not source.is_cuda:
+        dtype = torch.float32
+    source = source.to(dtype)
+    target = target.to(dtype)
 
-    def local_mean(data: Tensor) -> Tensor:
-        return avg_pool(
-            data,
-            kernel_size=kernel_size,
-            stride=1,
-            padding=None,
-            count_include_pad=False,
-        )
+    if isinstance(kernel_size, int):
+        kernel_size = (kernel_size,) * (source.ndim - 2)
+    else:
+        kernel_size = tuple(kernel_size)
 
-    source = source.float()
-    target = target.float()
+    key = (kernel_size, source.ndim, source.dtype)
+    loss = _call_compiled(_lcc_core, key, source, target, kernel_size, epsilon)
+    loss = masked_loss(loss, mask, "lcc_loss")
+    loss = reduce_loss(loss, reduction, mask, mask_sum=mask_sum)
+    return loss
 
-    source_mean = local_mean(source)
-    target_mean = local_mean(target)
 
-    x = source.sub(source_mean)
-    y = target.sub(target_mean)
+def _lcc_core(
+    source: Tensor, target: Tensor, kernel_size: Tuple[int, ...], epsilon: float
+) -> Tensor:
+    r"""Evaluate local normalized cross correlation loss at each grid point."""
+
+    def local_sum(data: Tensor) -> Tensor:
+        return _box_filter(data, kernel_size, divisor_override=1)
+
+    def local_mean(data: Tensor) -> Tensor:
+        return _box_filter(data, kernel_size, count_include_pad=False)
+
+    x = source.sub(local_mean(source))
+    y = target.sub(local_mean(target))
 
     a = local_sum(x.mul(y))
     b = local_sum(x.square())
     c = local_sum(y.square())
 
-    loss = a.square_().div_(b.mul_(c).add_(epsilon)).neg_().add_(1)
-    loss = masked_loss(loss, mask, "lcc_loss")
-    loss = reduce_loss(loss, reduction, mask)
-    return loss
+    return a.square_().div_(b.mul_(c).add_(epsilon)).neg_().add_(1)
+
+
+def _box_filter(data: Tensor, kernel_size: Tuple[int, ...], **kwargs) -> Tensor:
+    r"""Separable local sum or average of image data with zero padding.
+
+    A rectangular window is separable such that successive 1-dimensional pooling along each
+    spatial dimension yields the same result as :func:`avg_pool()` with the N-dimensional window,
+    but requires only ``sum(kernel_size)`` instead of ``prod(kernel_size)`` reads per grid point.
+    This also holds for ``count_include_pad=False``, because the number of grid points inside the
+    domain at the boundary is the product of these counts along each dimension.
+
+    """
+    D = data.ndim - 2
+    for dim, size in enumerate(kernel_size):
+        if size == 1:
+            continue
+        window = tuple(size if i == dim else 1 for i in range(D))
+        data = avg_pool(data, kernel_size=window, stride=1, padding=None, **kwargs)
+    return data
 
 
 def wlcc_loss(
@@ -907,6 +1115,7 @@ def mse_loss(
     mask: Optional[Tensor] = None,
     norm: Optional[Union[float, Tensor]] = None,
     reduction: str = "mean",
+    mask_sum: Optional[Union[float, Tensor]] = None,
 ) -> Tensor:
     r"""Average normalized squared differences.
 
@@ -919,12 +1128,13 @@ def mse_loss(
         norm: Positive factor by which to divide loss value.
         reduction: Whether to compute "mean" or "sum" over all grid points.
             If "none", output tensor shape is equal to the shape of the input tensors.
+        mask_sum: Precomputed ``mask.sum()`` used by :func:`reduce_loss()` if ``reduction="mean"``.
 
     Returns:
         Average normalized squared differences.
 
     """
-    return ssd_loss(input, target, mask=mask, norm=norm, reduction=reduction)
+    return ssd_loss(input, target, mask=mask, norm=norm, reduction=reduction, mask_sum=mask_sum)
 
 
 def ssd_loss(
@@ -933,6 +1143,7 @@ def ssd_loss(
     mask: Optional[Tensor] = None,
     norm: Optional[Union[float, Tensor]] = None,
     reduction: str = "sum",
+    mask_sum: Optional[Union[float, Tensor]] = None,
 ) -> Tensor:
     r"""Sum of normalized squared differences.
 
@@ -946,9 +1157,11 @@ def ssd_loss(
         input: Source image sampled on ``target`` grid.
         target: Target image with same shape as ``input``.
         mask: Multiplicative mask with same shape as ``input``.
-        norm: Positive factor by which to divide loss value.
+        norm: Positive factor by which to divide loss value. A constant factor is best given as
+            Python scalar, which avoids its conversion to a tensor.
         reduction: Whether to compute "mean" or "sum" over all grid points.
             If "none", output tensor shape is equal to the shape of the input tensors.
+        mask_sum: Precomputed ``mask.sum()`` used by :func:`reduce_loss()` if ``reduction="mean"``.
 
     Returns:
         Sum of normalized squared differences.
@@ -962,13 +1175,8 @@ def ssd_loss(
         raise ValueError("ssd_loss() 'input' must have same shape as 'target'")
     loss = input.sub(target).square()
     loss = masked_loss(loss, mask, "ssd_loss")
-    loss = reduce_loss(loss, reduction, mask)
-    if norm is not None:
-        norm = torch.as_tensor(norm, dtype=loss.dtype, device=loss.device).squeeze()
-        if not norm.ndim == 0:
-            raise ValueError("ssd_loss() 'norm' must be scalar")
-        if norm > 0:
-            loss = loss.div_(norm)
+    loss = reduce_loss(loss, reduction, mask, mask_sum=mask_sum)
+    loss = normalize_loss(loss, norm, "ssd_loss")
     return loss
 
 
@@ -1148,7 +1356,7 @@ def grad_loss(
             raise NotImplementedError(
                 "grad_loss() not implemented for linear transformation and 'reduction'='none'"
             )
-        return torch.tensor(0, dtype=u.dtype, device=u.device)
+        return u.new_zeros(())
     D = u.shape[1]
     if u.ndim - 2 != D:
         raise ValueError("grad_loss() 'u' must be tensor of shape (N, D, ..., X)")
@@ -1157,25 +1365,52 @@ def grad_loss(
     if spacing is None:
         spacing = tuple(reversed([2 / (n - 1) for n in u.shape[2:]]))
     kwargs = dict(mode=mode, sigma=sigma, spacing=spacing, stride=stride)
-    which = SpatialDerivativeKeys.all(spatial_dims=D, order=1)
-    deriv = spatial_derivatives(u, which=which, **kwargs)
-    if p == 1:
-        deriv = {k: v.abs_() for k, v in deriv.items()}
-    elif p != 0:
-        if p % 2 == 0:
-            deriv = {k: v.pow_(p) for k, v in deriv.items()}
-        else:
-            deriv = {k: v.abs_().pow_(p) for k, v in deriv.items()}
+    deriv = spatial_derivatives(u, which=_grad_keys(D), **kwargs)
+    loss = _grad_norm(list(deriv.values()), p=p, q=q)
+    loss = reduce_loss(loss, reduction)
+    return loss
+
+
+def _grad_norm(deriv: Sequence[Tensor], p: Union[int, float], q: Union[int, float]) -> Tensor:
+    r"""Evaluate ``sum(abs(du)**p)**q`` at each grid point given precomputed spatial derivatives.
+
+    The input derivative tensors are not modified such that these can be shared by other terms.
+
+    """
     loss: Optional[Tensor] = None
-    for value in deriv.values():
-        value = value.sum(dim=1, keepdim=True)
-        loss = value if loss is None else loss.add_(value)
+    if p in (1, 2):
+        norm_fn = _sum_abs if p == 1 else _sum_squares
+        loss = _call_compiled(norm_fn, (len(deriv), deriv[0].dtype), *deriv)
+    else:
+        for value in deriv:
+            if p != 0:
+                if p % 2 == 0:
+                    value = value.pow(p)
+                else:
+                    value = value.abs().pow_(p)
+            value = value.sum(dim=1, keepdim=True)
+            loss = value if loss is None else loss.add_(value)
     assert loss is not None
     if q == 0:
         loss.abs_()
     elif q != 1:
         loss.pow_(q)
-    loss = reduce_loss(loss, reduction)
+    return loss
+
+
+def _sum_abs(*deriv: Tensor) -> Tensor:
+    r"""Sum of absolute values of spatial derivatives at each grid point."""
+    loss = deriv[0].abs().sum(dim=1, keepdim=True)
+    for value in deriv[1:]:
+        loss = loss.add(value.abs().sum(dim=1, keepdim=True))
+    return loss
+
+
+def _sum_squares(*deriv: Tensor) -> Tensor:
+    r"""Sum of squared spatial derivatives at each grid point."""
+    loss = deriv[0].square().sum(dim=1, keepdim=True)
+    for value in deriv[1:]:
+        loss = loss.add(value.square().sum(dim=1, keepdim=True))
     return loss
 
 
@@ -1208,21 +1443,14 @@ def bending_loss(
             raise NotImplementedError(
                 "bending_energy() not implemented for linear transformation and 'reduction'='none'"
             )
-        return torch.tensor(0, dtype=u.dtype, device=u.device)
+        return u.new_zeros(())
     D = u.shape[1]
     if u.ndim - 2 != D:
         raise ValueError("bending_energy() 'u' must be tensor of shape (N, D, ..., X)")
     kwargs = dict(mode=mode or "sobel", sigma=sigma, spacing=spacing, stride=stride)
-    which = FlowDerivativeKeys.all(spatial_dims=D, order=2)
-    which = sorted(FlowDerivativeKeys.unique(which))
+    which = list(itertools.chain.from_iterable(_bending_keys(D)))
     deriv = flow_derivatives(u, which=which, **kwargs)
-    loss: Optional[Tensor] = None
-    for key, value in deriv.items():
-        value = value.square_()
-        if FlowDerivativeKeys.is_mixed(key):
-            value = value.mul_(2)
-        loss = value if loss is None else loss.add_(value)
-    assert loss is not None
+    loss = _bending_term(deriv, D)
     loss = reduce_loss(loss, reduction)
     return loss
 
@@ -1292,19 +1520,14 @@ def curvature_loss(
             raise NotImplementedError(
                 "curvature_loss() not implemented for linear transformation and reduction='none'"
             )
-        return torch.tensor(0, dtype=u.dtype, device=u.device)
-    N = u.shape[0]
+        return u.new_zeros(())
     D = u.shape[1]
     if u.ndim - 2 != D:
         raise ValueError(f"curvature_loss() 'u' must be tensor of shape (N, {u.ndim - 2}, ..., X)")
     kwargs = dict(mode=mode or "sobel", sigma=sigma, spacing=spacing, stride=stride)
-    which = FlowDerivativeKeys.curvature(spatial_dims=D)
+    which = list(itertools.chain.from_iterable(_curvature_keys(D)))
     deriv = flow_derivatives(u, which=which, **kwargs)
-    shape = deriv["du/dxx"].shape
-    loss = torch.zeros((N, D) + shape[2:], dtype=u.dtype, device=u.device)
-    for i, j in itertools.product(range(D), repeat=2):
-        loss.narrow(1, i, 1).add_(deriv[FlowDerivativeKeys.symbol(i, j, j)])
-    loss = loss.square_().sum(dim=1, keepdim=True)
+    loss = _curvature_term(deriv, D)
     loss = reduce_loss(loss, reduction)
     return loss.mul_(0.5)
 
@@ -1366,7 +1589,7 @@ def divergence_loss(
             raise NotImplementedError(
                 "divergence_loss() not implemented for linear transformation and reduction='none'"
             )
-        return torch.tensor(0, dtype=u.dtype, device=u.device)
+        return u.new_zeros(())
     kwargs = dict(mode=mode, sigma=sigma, spacing=spacing, stride=stride)
     loss = divergence(u, **kwargs).square_()
     loss = reduce_loss(loss, reduction)
@@ -1536,24 +1759,27 @@ def elasticity_loss(
             raise NotImplementedError(
                 "elasticity_loss() not implemented for linear transformation and reduction='none'"
             )
-        return torch.tensor(0, dtype=u.dtype, device=u.device)
+        return u.new_zeros(())
     N = u.shape[0]
     D = u.shape[1]
     if u.ndim - 2 != D:
         raise ValueError(f"elasticity_loss() 'u' must be tensor of shape (N, {u.ndim - 2}, ..., X)")
     kwargs = dict(mode=mode, sigma=sigma, spacing=spacing, stride=stride)
-    which = FlowDerivativeKeys.jacobian(spatial_dims=D)
+    which = _jacobian_keys(D)
     deriv = flow_derivatives(u, which=which, **kwargs)
-    loss = torch.zeros((N, 1) + u.shape[2:], dtype=u.dtype, device=u.device)
+    # Jacobian matrices as tensor of shape (N, D, D, ..., X)
+    jac = torch.cat([deriv[key] for key in which], dim=1)
+    jac = jac.reshape((N, D, D) + jac.shape[2:])
+    loss: Optional[Tensor] = None
     if lambd != 0:
-        for i in range(D):
-            loss = loss.add_(deriv[FlowDerivativeKeys.symbol(i, i)])
+        loss = jac.diagonal(dim1=1, dim2=2).sum(dim=-1).unsqueeze_(1)
         loss = loss.square_().mul_(lambd / 2)
     if mu != 0:
-        for j, k in itertools.product(range(D), repeat=2):
-            djk = deriv[FlowDerivativeKeys.symbol(j, k)]
-            dkj = deriv[FlowDerivativeKeys.symbol(k, j)]
-            loss = loss.add_(djk.add(dkj).square_().mul_(mu / 4))
+        strain = jac.add(jac.transpose(1, 2)).square_().sum(dim=(1, 2)).unsqueeze_(1)
+        strain = strain.mul_(mu / 4)
+        loss = strain if loss is None else loss.add_(strain)
+    if loss is None:
+        loss = torch.zeros((N, 1) + jac.shape[3:], dtype=u.dtype, device=u.device)
     loss = reduce_loss(loss, reduction)
     return loss
 
@@ -1588,6 +1814,104 @@ def total_variation_loss(
 tv_loss = total_variation_loss
 
 
+# Regularization terms supported by regularization_losses() and their default derivatives mode
+REGULARIZATION_TERMS = {
+    "bending": "sobel",
+    "curvature": "sobel",
+    "diffusion": None,
+    "divergence": None,
+    "tv": None,
+}
+
+
+def regularization_losses(
+    u: Tensor,
+    terms: Union[str, Sequence[str]],
+    mode: Optional[str] = None,
+    sigma: Optional[float] = None,
+    spacing: Optional[Union[Scalar, Array]] = None,
+    stride: Optional[ScalarOrTuple] = None,
+    reduction: str = "mean",
+) -> Dict[str, Tensor]:
+    r"""Evaluate multiple regularization terms of vector fields with shared spatial derivatives.
+
+    The value of each term is equal to the one returned by the respective loss function, i.e.,
+    :func:`bending_loss()`, :func:`curvature_loss()`, :func:`diffusion_loss()`,
+    :func:`divergence_loss()`, and :func:`tv_loss()`. But the spatial derivatives of ``u``
+    are computed only once for all terms which use the same ``mode`` of approximation.
+
+    Args:
+        u: Batch of vector fields as tensor of shape ``(N, D, ..., X)``. When a tensor with less than
+            four dimensions is given, it is assumed to be a linear transformation and zero is returned.
+        terms: Names of regularization terms to evaluate (cf. ``REGULARIZATION_TERMS``).
+        mode: Method used to approximate :func:`flow_derivatives()`. If ``None``, the default
+            of the loss function corresponding to each term is used.
+        sigma: Standard deviation of Gaussian in grid units used to smooth vector field.
+        spacing: Step size to use when computing finite differences.
+        stride: Number of output grid points between control points plus one for ``mode='bspline'``.
+        reduction: Specifies the reduction to apply to the output: 'none' | 'mean' | 'sum'.
+
+    Returns:
+        Dictionary of regularization loss values keyed by term name.
+
+    """
+    if isinstance(terms, str):
+        terms = [terms]
+    for term in terms:
+        if term not in REGULARIZATION_TERMS:
+            raise ValueError(f"regularization_losses() unknown term: {term!r}")
+    if u.ndim < 4:
+        # No loss for homogeneous coordinate transformations
+        if reduction == "none":
+            raise NotImplementedError(
+                "regularization_losses() not implemented for linear transformation and reduction='none'"
+            )
+        return {term: u.new_zeros(()) for term in terms}
+    D = u.shape[1]
+    if u.ndim - 2 != D:
+        raise ValueError(
+            f"regularization_losses() 'u' must be tensor of shape (N, {u.ndim - 2}, ..., X)"
+        )
+    # Union of flow derivatives required by terms which use the same approximation
+    which: Dict[Optional[str], Set[str]] = {}
+    for term in terms:
+        term_mode = mode or REGULARIZATION_TERMS[term]
+        if term == "bending":
+            keys = itertools.chain.from_iterable(_bending_keys(D))
+        elif term == "curvature":
+            keys = itertools.chain.from_iterable(_curvature_keys(D))
+        elif term == "divergence":
+            keys = FlowDerivativeKeys.divergence(spatial_dims=D)
+        else:
+            keys = _jacobian_keys(D)
+        which.setdefault(term_mode, set()).update(keys)
+    kwargs = dict(sigma=sigma, spacing=spacing, stride=stride)
+    derivs = {
+        term_mode: flow_derivatives(u, which=sorted(keys), mode=term_mode, **kwargs)
+        for term_mode, keys in which.items()
+    }
+    # Evaluate regularization terms without modifying shared derivatives
+    losses = {}
+    for term in terms:
+        deriv = derivs[mode or REGULARIZATION_TERMS[term]]
+        if term == "bending":
+            loss = reduce_loss(_bending_term(deriv, D), reduction)
+        elif term == "curvature":
+            loss = reduce_loss(_curvature_term(deriv, D), reduction).mul_(0.5)
+        elif term == "diffusion":
+            loss = _grad_norm([deriv[key] for key in _jacobian_keys(D)], p=2, q=1)
+            loss = reduce_loss(loss, reduction).mul_(0.5)
+        elif term == "divergence":
+            div = [deriv[key] for key in FlowDerivativeKeys.divergence(spatial_dims=D)]
+            loss = _grad_norm([sum(div)], p=2, q=1)
+            loss = reduce_loss(loss, reduction).mul_(0.5)
+        else:
+            loss = _grad_norm([deriv[key] for key in _jacobian_keys(D)], p=1, q=1)
+            loss = reduce_loss(loss, reduction)
+        losses[term] = loss
+    return losses
+
+
 def inverse_consistency_loss(
     forward: Tensor,
     inverse: Tensor,
@@ -1655,7 +1979,8 @@ def inverse_consistency_loss(
             raise ValueError(
                 f"inverse_consistency_loss() 'mask' batch size must be 1 or {error.shape[0]}"
             )
-        error[move_dim(mask == 0, 1, -1).expand_as(error)] = 0
+        mask = mask != 0
+        error = error.masked_fill_(~move_dim(mask, 1, -1), 0)
     # Discard error at grid boundary
     if margin > 0:
         if isinstance(margin, float):
@@ -1666,21 +1991,21 @@ def inverse_consistency_loss(
             m = [int(margin * n) for n in grid.size()]
         else:
             m = [max(0, int(margin))] * grid.ndim
-        subgrid = tuple(reversed([slice(i, n - i) for i, n in zip(m, grid.size())]))
-        error = error[(slice(0, error.shape[0]),) + subgrid + (slice(0, grid.ndim),)]
+        for dim, (i, n) in enumerate(zip(m, grid.size())):
+            error = error.narrow(grid.ndim - dim, min(i, n), max(0, n - 2 * i))
     # Scale differences by respective error units
     if units in ("voxel", "world"):
         error = denormalize_flow(error, size=grid.size(), channels_last=True)
         if units == "world":
             error *= grid.spacing().to(error)
     # Calculate error norm
-    error: Tensor = error.norm(p=2, dim=-1)
+    error = torch.linalg.vector_norm(error, ord=2, dim=-1)
     # Reduce error if requested
     if reduction != "none":
         count = error.numel()
         error = error.sum()
         if reduction == "mean" and mask is not None:
-            count = (mask != 0).sum()
+            count = mask.sum()
         error /= count
     return error
 
@@ -1720,12 +2045,7 @@ def elementwise_loss(
         loss = loss_fn(input, target, reduction="none")
         loss = masked_loss(loss, mask, name)
         loss = reduce_loss(loss, reduction, mask)
-    if norm is not None:
-        norm = torch.as_tensor(norm, dtype=loss.dtype, device=loss.device).squeeze()
-        if not norm.ndim == 0:
-            raise ValueError(f"{name}() 'norm' must be scalar")
-        if norm > 0:
-            loss = loss.div_(norm)
+    loss = normalize_loss(loss, norm, name)
     return loss
 
 
@@ -1755,8 +2075,50 @@ def masked_loss(
     return loss
 
 
-def reduce_loss(loss: Tensor, reduction: str = "mean", mask: Optional[Tensor] = None) -> Tensor:
-    r"""Reduce loss computed at each grid point."""
+def normalize_loss(
+    loss: Tensor, norm: Optional[Union[float, Tensor]] = None, name: Optional[str] = None
+) -> Tensor:
+    r"""Divide loss by an optionally specified positive normalization factor.
+
+    When ``norm`` is a Python scalar, the loss is divided by it directly without first
+    converting it to a tensor, which is the preferred way of passing a constant factor.
+
+    """
+    if norm is None:
+        return loss
+    if isinstance(norm, (int, float)):
+        if norm > 0:
+            loss = loss.div_(norm)
+        return loss
+    if not name:
+        name = "normalize_loss"
+    norm = torch.as_tensor(norm, dtype=loss.dtype, device=loss.device).squeeze()
+    if not norm.ndim == 0:
+        raise ValueError(f"{name}() 'norm' must be scalar")
+    if norm > 0:
+        loss = loss.div_(norm)
+    return loss
+
+
+def reduce_loss(
+    loss: Tensor,
+    reduction: str = "mean",
+    mask: Optional[Tensor] = None,
+    mask_sum: Optional[Union[float, Tensor]] = None,
+) -> Tensor:
+    r"""Reduce loss computed at each grid point.
+
+    Args:
+        loss: Loss values at each grid point.
+        reduction: Either ``none``, ``mean``, or ``sum``.
+        mask: Mask with which ``loss`` was multiplied, or ``None``.
+        mask_sum: Precomputed ``mask.sum()``. This can be used to avoid repeated summation
+            when the same ``mask`` is used for multiple losses with ``reduction="mean"``.
+
+    Returns:
+        Reduced loss value.
+
+    """
     if reduction not in ("mean", "sum", "none"):
         raise ValueError("reduce_loss() 'reduction' must be 'mean', 'sum' or 'none'")
     if reduction == "none":
@@ -1765,6 +2127,11 @@ def reduce_loss(loss: Tensor, reduction: str = "mean", mask: Optional[Tensor] =
         return loss.mean() if reduction == "mean" else loss.sum()
     value = loss.sum()
     if reduction == "mean":
-        numel = mask.expand_as(loss).sum()
+        # Number of elements of broadcast mask without materializing expanded tensor
+        if torch.broadcast_shapes(mask.shape, loss.shape) != loss.shape:
+            raise ValueError("reduce_loss() 'mask' must be broadcastable to shape of 'loss'")
+        if mask_sum is None:
+            mask_sum = mask.sum(dtype=value.dtype)
+        numel = mask_sum * (loss.numel() // mask.numel())
         value = value.div_(numel)
     return value
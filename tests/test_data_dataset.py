@@ -0,0 +1,309 @@
+import pickle
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+import pytest
+from torch.nn import Module, Sequential
+from torch.utils.data import DataLoader
+
+from deepali.data import GroupDataset, ImageDataset, ImageDatasetConfig, JoinDataset, MetaDataset
+from deepali.data.dataset import read_table
+from deepali.data.transforms import ItemTransform, ItemwiseTransform
+
+
+def index_table() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "id": ["a", "b", "c"],
+            "age": [31, 42, 57],
+            "image": ["a/image.nii.gz", "b/image.nii.gz", "c/image.nii.gz"],
+        }
+    )
+
+
+def test_meta_dataset_row() -> None:
+    dataset = MetaDataset(index_table())
+    assert len(dataset) == 3
+    row = dataset.row(1)
+    assert row == {"id": "b", "age": 42, "image": "b/image.nii.gz"}
+    row["age"] = 0
+    assert dataset.row(1)["age"] == 42
+    assert dataset.sample(2) == {"id": "c", "age": 57, "image": "c/image.nii.gz"}
+
+
+def test_meta_dataset_paths() -> None:
+    paths = {
+        "img": "{prefix}/{id}/{age}.nii.gz",
+        "seg": "{prefix}/{id}/seg_{index+1}{suffix}",
+        "col": "image",
+        "fn": lambda id, index, **kwargs: f"{id}_{index}",
+    }
+    dataset = MetaDataset(index_table(), paths=paths, prefix="/data", suffix=".nii.gz")
+    sample = dataset.sample(1)
+    assert sample["img"] == "/data/b/42.nii.gz"
+    assert sample["seg"] == "/data/b/seg_2.nii.gz"
+    assert sample["col"] == "b/image.nii.gz"
+    assert sample["fn"] == "b_1"
+    meta = sample["meta"]
+    assert meta["id"] == "b"
+    assert all(meta[name] == sample[name] for name in paths)
+
+
+def test_read_table(tmp_path: Path) -> None:
+    path = tmp_path / "index.tsv"
+    path.write_text("# comment\nid\tage\tdate\n\na\t31\t2020-01-01\nb\t42\t2021-02-03\n")
+    table = read_table(path)
+    assert list(table.columns) == ["id", "age", "date"]
+    assert table.to_dict(orient="records") == [
+        {"id": "a", "age": 31, "date": "2020-01-01"},
+        {"id": "b", "age": 42, "date": "2021-02-03"},
+    ]
+    dataset = MetaDataset(path, paths={"img": "{prefix}/{id}.nii.gz"})
+    assert dataset.sample(1)["img"] == (tmp_path / "b.nii.gz").as_posix()
+
+
+def test_read_table_missing_values(tmp_path: Path) -> None:
+    path = tmp_path / "index.csv"
+    path.write_text("id,site,date\na,,2020-01-01\nb,NA,\nc,<NA>,2021-02-03\n")
+    table = read_table(path)
+    assert table["site"].isna().tolist() == [True, True, True]
+    assert table["date"].isna().tolist() == [False, True, False]
+    assert table.equals(pd.read_csv(path))
+    path.write_text("a,b,a\n1,2,3\n")
+    assert list(read_table(path).columns) == ["a", "b", "a.1"]
+
+
+def test_read_table_quoted_values(tmp_path: Path) -> None:
+    path = tmp_path / "index.csv"
+    path.write_text('id,note\na,"first line\n\nsecond line"\nb,"x, y"\n')
+    table = read_table(path)
+    assert table["note"].tolist() == ["first line\n\nsecond line", "x, y"]
+
+
+def test_meta_dataset_transform() -> None:
+    class AddAge(Module):
+        def __init__(self, value: int) -> None:
+            super().__init__()
+            self.value = value
+
+        def forward(self, sample: Dict[str, Any]) -> Dict[str, Any]:
+            sample["age"] += self.value
+            return sample
+
+    dataset = MetaDataset(index_table(), transforms=Sequential(AddAge(1), AddAge(10)))
+    assert dataset[0]["age"] == 42
+    assert len(dataset.transforms()) == 2
+    assert isinstance(dataset.transform(), Sequential)
+    other = dataset.transform(lambda sample: sample["id"])
+    assert type(other) is MetaDataset
+    assert other._rows is dataset._rows
+    assert other[0] == "a"
+    assert dataset[0]["age"] == 42
+    assert len(dataset.transform_(None).transforms()) == 0
+    assert dataset[0]["age"] == 31
+    dataset.transform().add_module("add", AddAge(100))
+    assert dataset[0]["age"] == 31
+    dataset.transform_(dataset.transforms(), AddAge(1), AddAge(100))
+    assert len(dataset.transforms()) == 2
+    assert dataset[0]["age"] == 132
+
+
+def test_meta_dataset_fused_item_transforms() -> None:
+    class Add(ItemwiseTransform, Module):
+        def __init__(self, value: int) -> None:
+            super().__init__()
+            self.value = value
+
+        def forward(self, value: int) -> int:
+            return value + self.value
+
+    transforms = [
+        ItemTransform(Add(1), key="age"),
+        ItemTransform(Add(10), key="age"),
+        ItemTransform(Add(100), key="age", ignore_missing=True),
+    ]
+    dataset = MetaDataset(index_table(), transforms=transforms)
+    assert dataset.transforms() == transforms
+    assert len(dataset._transform_fns) == 2
+    assert dataset[0]["age"] == 142
+
+
+def test_meta_dataset_unfused_item_transforms() -> None:
+    class Pair(Module):
+        def forward(self, value: int) -> List[int]:
+            return [value, value + 1]
+
+    class Inc(Module):
+        def forward(self, value: int) -> int:
+            return value + 1
+
+    transforms = [ItemTransform(Pair(), key="n"), ItemTransform(Inc(), key="n")]
+    dataset = MetaDataset(pd.DataFrame({"n": [1]}), transforms=transforms)
+    assert len(dataset._transform_fns) == 2
+    assert dataset[0] == {"n": [2, 3]}
+
+
+def test_group_dataset() -> None:
+    table = index_table()
+    table["group"] = ["x", "y", "x"]
+    table.index = [10, 20, 30]
+    groups = GroupDataset(MetaDataset(table), groupby="group", sortby="age", ascending=False)
+    assert len(groups) == 2
+    assert groups.indices == [[2, 0], [1]]
+    assert [sample["id"] for sample in groups[0]] == ["c", "a"]
+    assert groups[0] is groups[0]
+
+
+def test_meta_dataset_samples() -> None:
+    dataset = MetaDataset(index_table())
+    assert [sample["id"] for sample in dataset.samples()] == ["a", "b", "c"]
+    dataset = MetaDataset(index_table(), paths={"img": "{id}.nii.gz"})
+    assert [sample["img"] for sample in dataset.samples()] == ["a.nii.gz", "b.nii.gz", "c.nii.gz"]
+
+
+def test_meta_dataset_samples_override() -> None:
+    class SampleDataset(MetaDataset):
+        def sample(self, index: int) -> Dict[str, Any]:
+            data = super().sample(index)
+            data["index"] = index
+            return data
+
+    dataset = SampleDataset(index_table())
+    assert [sample["index"] for sample in dataset.samples()] == [0, 1, 2]
+
+
+def test_meta_dataset_getitems() -> None:
+    paths = {"img": "{prefix}/{id}/{age}.nii.gz", "col": "image"}
+    dataset = MetaDataset(index_table(), paths=paths, prefix="/data")
+    dataset = dataset.transform(ItemTransform(lambda path: path.upper(), key="img"))
+    indices = [2, 0, 2]
+    assert dataset.__getitems__(indices) == [dataset[index] for index in indices]
+    loader = DataLoader(dataset, batch_size=2)
+    batch = next(iter(loader))
+    assert batch["img"] == ["/DATA/A/31.NII.GZ", "/DATA/B/42.NII.GZ"]
+
+
+def test_meta_dataset_getitems_override() -> None:
+    class SampleDataset(MetaDataset):
+        def sample(self, index: int) -> Dict[str, Any]:
+            data = super().sample(index)
+            data["index"] = index
+            return data
+
+    class GetItemDataset(MetaDataset):
+        def __getitem__(self, index: int) -> Dict[str, Any]:
+            return {"index": index}
+
+    indices = [2, 0]
+    dataset = SampleDataset(index_table(), paths={"img": "{id}.nii.gz"})
+    assert [data["index"] for data in dataset.__getitems__(indices)] == indices
+    dataset = GetItemDataset(index_table())
+    assert dataset.__getitems__(indices) == [{"index": 2}, {"index": 0}]
+
+
+def test_join_dataset() -> None:
+    table = index_table()
+    dataset = JoinDataset(
+        [
+            MetaDataset(table[["id", "age"]]),
+            MetaDataset(table[["id", "image"]]),
+        ]
+    )
+    assert len(dataset) == 3
+    assert dataset[1] == {"id": "b", "age": 42, "image": "b/image.nii.gz"}
+    dataset = JoinDataset([MetaDataset(table), MetaDataset(table.iloc[::-1])])
+    with pytest.raises(ValueError):
+        dataset[0]
+
+
+def test_image_dataset_from_config(tmp_path: Path) -> None:
+    path = tmp_path / "index.csv"
+    index_table().to_csv(path, index=False)
+    config = ImageDatasetConfig.from_dict(
+        {
+            "table": path,
+            "images": {"img": "{prefix}/{image}"},
+            "transforms": {"img": [{"read": {"dtype": "float32"}}, {"avgpool": [2]}]},
+        }
+    )
+    a = ImageDataset.from_config(config)
+    b = ImageDataset.from_config(config)
+    assert len(a) == 3
+    assert a.sample(0)["img"] == (tmp_path / "a" / "image.nii.gz").as_posix()
+    assert len(a.transforms()) == len(b.transforms())
+    assert all(x is not y for x, y in zip(a.transforms(), b.transforms()))
+
+
+def test_meta_dataset_shared_strings() -> None:
+    table = pd.DataFrame(
+        {"id": [f"s{i}" for i in range(4)], "group": [f"g{i % 2}" for i in range(4)]}
+    )
+    dataset = MetaDataset(table)
+    assert dataset.row(0)["group"] is dataset.row(2)["group"]
+    assert [row["group"] for row in dataset.samples()] == ["g0", "g1", "g0", "g1"]
+
+
+def test_meta_dataset_table() -> None:
+    table = index_table()
+    dataset = MetaDataset(table)
+    assert dataset._table is None
+    assert dataset.table.equals(table)
+    dataset = MetaDataset(table, keep_table=True)
+    assert dataset.table is table
+    dataset = MetaDataset(table, paths={"img": "{id}.nii.gz"})
+    dataset.table = table.iloc[1:]
+    assert len(dataset) == 2
+    assert dataset.table.equals(table.iloc[1:].reset_index(drop=True))
+    assert dataset[0]["img"] == "b.nii.gz"
+    with pytest.raises(ValueError):
+        dataset.table = table.assign(meta=0)
+
+
+def test_read_table_dtypes(tmp_path: Path) -> None:
+    path = tmp_path / "index.csv"
+    path.write_text("id,age\n001,31\n002,42\n")
+    assert read_table(path)["id"].tolist() == [1, 2]
+    assert read_table(path, dtype={"id": str})["id"].tolist() == ["001", "002"]
+    path.with_name(path.name + ".dtypes.json").write_text('{"id": "str", "age": "float64"}')
+    table = read_table(path)
+    assert table["id"].tolist() == ["001", "002"]
+    assert table["age"].dtype == "float64"
+
+
+def test_read_table_columns(tmp_path: Path) -> None:
+    table = index_table()
+    path = tmp_path / "index.csv"
+    table.to_csv(path, index=False)
+    assert list(read_table(path, columns=["id", "image"]).columns) == ["id", "image"]
+    pytest.importorskip("tables")
+    path = tmp_path / "index.h5"
+    table.to_hdf(path, key="index", format="table")
+    assert read_table(path, columns=["age"])["age"].tolist() == [31, 42, 57]
+    table.to_hdf(path, key="index", format="fixed")
+    assert read_table(path, columns=["age"])["age"].tolist() == [31, 42, 57]
+
+
+def test_meta_dataset_update_paths() -> None:
+    dataset = MetaDataset(index_table(), paths={"img": "{prefix}/{id}.nii.gz"}, prefix="/data")
+    dataset.prefix = "/other"
+    assert dataset.prefix == Path("/other")
+    assert dataset[1]["img"] == "/other/b.nii.gz"
+    dataset.paths = {**dataset.paths, "seg": "{prefix}/{id}_{suffix}.nii.gz"}
+    dataset.kwargs = {"suffix": "seg"}
+    assert dataset[1]["seg"] == "/other/b_seg.nii.gz"
+    with pytest.raises(TypeError):
+        dataset.paths["seg"] = "{id}.nii.gz"
+    with pytest.raises(ValueError):
+        dataset.paths = {"meta": "{id}.nii.gz"}
+
+
+def test_meta_dataset_pickle() -> None:
+    paths = {"img": "{prefix}/{id}/{age}.nii.gz", "seg": "{id}_{index+1}.nii.gz", "col": "image"}
+    dataset = MetaDataset(index_table(), paths=paths, prefix="/data")
+    other = pickle.loads(pickle.dumps(dataset))
+    assert [other[i] for i in range(len(other))] == [dataset[i] for i in range(len(dataset))]
+    loader = DataLoader(dataset, batch_size=2, num_workers=1, multiprocessing_context="spawn")
+    batch = next(iter(loader))
+    assert batch["img"] == ["/data/a/31.nii.gz", "/data/b/42.nii.gz"]
+    assert batch["seg"] == ["a_1.nii.gz", "b_2.nii.gz"]
@@ -21,3 +21,53 @@ def test_losses_flow_curvature() -> None:
     assert loss.requires_grad
     loss = loss.detach()
     assert loss.abs().max().lt(1e-5)
+
+
+def test_losses_flow_elasticity() -> None:
+    grid = Grid(size=(16, 14))
+    offset = U.translation([0.1, 0.2]).unsqueeze_(0)
+    flow = U.affine_flow(offset, grid)
+    loss = L.elasticity_loss(flow, first_parameter=1, second_parameter=1, reduction="none")
+    assert loss.shape == (1, 1, 14, 16)
+    assert loss.abs().max().lt(1e-5)
+    flow = torch.randn((2, 3, 8, 7, 6))
+    a = L.elasticity_loss(flow, first_parameter=1, second_parameter=0)
+    b = L.divergence_loss(flow, reduction="none").sum(dim=1).mean()
+    assert torch.allclose(a, b)
+
+
+def test_losses_flow_inverse_consistency() -> None:
+    grid = Grid(size=(16, 14))
+    forward = U.affine_flow(U.translation([0.1, 0.2]).unsqueeze_(0), grid)
+    inverse = U.affine_flow(U.translation([-0.1, -0.2]).unsqueeze_(0), grid)
+    mask = torch.zeros((1, 1, 14, 16))
+    mask[..., 4:10, 4:12] = 1
+    loss = L.inverse_consistency_loss(forward, inverse, grid=grid, margin=2, reduction="none")
+    assert loss.shape == (1, 10, 12)
+    assert loss.abs().max().lt(1e-5)
+    loss = L.inverse_consistency_loss(forward, forward, grid=grid, mask=mask, margin=2)
+    assert torch.allclose(loss, torch.tensor(0.2).hypot(torch.tensor(0.4)))
+    forward[..., 0, 0] = float("nan")
+    loss = L.inverse_consistency_loss(forward, inverse, grid=grid, mask=mask)
+    assert loss.isfinite() and loss.abs().lt(1e-5)
+    loss = L.inverse_consistency_loss(forward, inverse, grid=grid, margin=8, reduction="none")
+    assert loss.shape == (1, 0, 0)
+    loss = L.inverse_consistency_loss(forward, inverse, grid=grid, margin=20, reduction="none")
+    assert loss.shape == (1, 0, 0)
+
+
+def test_losses_flow_regularization() -> None:
+    flow = torch.randn((2, 3, 8, 7, 6))
+    terms = {
+        "bending": L.bending_loss,
+        "curvature": L.curvature_loss,
+        "diffusion": L.diffusion_loss,
+        "divergence": L.divergence_loss,
+        "tv": L.tv_loss,
+    }
+    losses = L.regularization_losses(flow, list(terms))
+    assert list(losses.keys()) == list(terms.keys())
+    for name, loss_fn in terms.items():
+        assert torch.allclose(losses[name], loss_fn(flow), atol=1e-5)
+    losses = L.regularization_losses(flow, "bending", mode="central", reduction="none")
+    assert torch.allclose(losses["bending"], L.bending_loss(flow, mode="central", reduction="none"))
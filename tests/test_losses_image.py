@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+import torch
+from torch._dynamo.exc import Unsupported
+
+import deepali.losses.functional as L
+
+
+def test_losses_image_lcc() -> None:
+    source = torch.rand((2, 1, 16, 14))
+    target = torch.rand((2, 1, 16, 14))
+    loss = L.lcc_loss(source, source)
+    assert loss.abs().lt(1e-5)
+    a = L.lcc_loss(source, target, kernel_size=5, reduction="none")
+    b = L.lcc_loss(source, target, kernel_size=[5, 5], reduction="none")
+    assert a.shape == source.shape
+    assert torch.allclose(a, b)
+    assert a.ge(0).all() and a.le(1).all()
+
+
+def test_losses_image_dtype() -> None:
+    source = torch.rand((2, 3, 8, 8))
+    target = torch.rand((2, 3, 8, 8))
+    for dtype in (torch.bfloat16, torch.float64):
+        assert L.dice_score(source.to(dtype), target.to(dtype)).dtype == dtype
+        assert L.lcc_loss(source.to(dtype), target.to(dtype)).dtype == dtype
+    assert L.dice_score(source.half(), target.half()).dtype == torch.float32
+    assert L.dice_score(source, target.gt(0.5)).dtype == torch.float32
+    source = torch.rand((1, 1, 8, 8, 8)).bfloat16()
+    target = torch.rand((1, 1, 8, 8, 8)).bfloat16()
+    assert L.lcc_loss(source, target).dtype == torch.float32
+
+
+def test_losses_label_smoothing() -> None:
+    labels = torch.tensor([0, 1, 2, 1]).reshape(1, 1, 2, 2)
+    target = L.label_smoothing(labels, num_classes=3, alpha=0.1)
+    assert target.shape == (1, 3, 2, 2)
+    assert torch.allclose(target.sum(dim=1), torch.ones((1, 2, 2)))
+    assert torch.allclose(target[0, :, 0, 0], torch.tensor([0.9, 0.05, 0.05]))
+    labels[0, 0, 1, 1] = -1
+    target = L.label_smoothing(labels, ignore_index=-1, alpha=0)
+    assert target.shape == (1, 3, 2, 2)
+    assert target[0, :, 1, 1].eq(-1).all()
+    assert target[0, :, 0, 1].tolist() == [0, 1, 0]
+    with pytest.raises(ValueError):
+        L.label_smoothing(torch.full((1, 1, 2, 2), -1), ignore_index=-1)
+    with pytest.raises(ValueError):
+        L.label_smoothing(torch.zeros((1, 1, 2, 2)), alpha=0.1)
+    assert L.label_smoothing(torch.zeros((1, 1, 2, 2)), alpha=0).eq(1).all()
+
+
+def test_losses_image_ssd_norm() -> None:
+    input = torch.rand((2, 1, 8, 8))
+    target = torch.rand((2, 1, 8, 8))
+    loss = L.ssd_loss(input, target)
+    assert torch.allclose(L.ssd_loss(input, target, norm=2), loss / 2)
+    assert torch.allclose(L.ssd_loss(input, target, norm=torch.tensor([2.0])), loss / 2)
+    assert torch.allclose(L.ssd_loss(input, target, norm=0), loss)
+    assert torch.allclose(L.mae_loss(input, target, norm=4.0), L.mae_loss(input, target) / 4)
+
+
+def test_losses_image_mask_sum() -> None:
+    input = torch.rand((2, 3, 8, 8))
+    target = torch.rand((2, 3, 8, 8))
+    mask = torch.rand((2, 1, 8, 8)).gt(0.5).float()
+    loss = L.mse_loss(input, target, mask=mask)
+    assert torch.allclose(loss, input.sub(target).square().mul(mask).sum() / (3 * mask.sum()))
+    assert torch.allclose(L.mse_loss(input, target, mask=mask, mask_sum=mask.sum()), loss)
+    loss = L.lcc_loss(input, target, mask=mask)
+    assert torch.allclose(L.lcc_loss(input, target, mask=mask, mask_sum=mask.sum()), loss)
+
+
+def test_losses_compile_fallback(monkeypatch: pytest.MonkeyPatch) -> None:
+    def compiled(fn, key):
+        def fail(*args):
+            raise Unsupported("test")
+
+        return fail
+
+    def eager(input):
+        return "eager"
+
+    def error(input):
+        raise ValueError("test")
+
+    monkeypatch.setattr(L, "_compiled", compiled)
+    monkeypatch.setattr(L, "_COMPILE", True)
+    input = SimpleNamespace(is_cuda=True)
+    with pytest.warns(RuntimeWarning):
+        assert L._call_compiled(eager, (), input) == "eager"
+    assert not L._COMPILE
+    L.set_compile_enabled(True)
+    monkeypatch.setattr(L, "_compiled", lambda fn, key: fn)
+    with pytest.raises(ValueError):
+        L._call_compiled(error, (), input)
+    assert L._COMPILE
+    L.set_compile_enabled(False)
+    assert L._call_compiled(eager, (), input) == "eager"